@@ -36,8 +36,13 @@ from airflow.utils.state import DagRunState, State, TaskInstanceState
 from airflow.utils.types import DagRunType
 
 
+@provide_session
 def _create_dagruns(
-    dag: DAG, execution_dates: List[datetime], state: DagRunState, run_type: DagRunType
+    dag: DAG,
+    execution_dates: List[datetime],
+    state: DagRunState,
+    run_type: DagRunType,
+    session: SASession = NEW_SESSION,
 ) -> List[DagRun]:
     """
     Infers from the dates which dag runs need to be created and does so.
@@ -46,10 +51,11 @@ def _create_dagruns(
     :param execution_dates: list of execution dates to evaluate
     :param state: the state to set the dag run to
     :param run_type: The prefix will be used to construct dag run id: {run_id_prefix}__{execution_date}
+    :param session: database session
     :return: newly created and existing dag runs for the execution dates supplied
     """
     # find out if we need to create any dag runs
-    dag_runs = DagRun.find(dag_id=dag.dag_id, execution_date=execution_dates)
+    dag_runs = DagRun.find(dag_id=dag.dag_id, execution_date=execution_dates, session=session)
     dates_to_create = list(set(execution_dates) - {dag_run.execution_date for dag_run in dag_runs})
 
     for date in dates_to_create:
@@ -59,6 +65,7 @@ def _create_dagruns(
             external_trigger=False,
             state=state,
             run_type=run_type,
+            session=session,
         )
         dag_runs.append(dag_run)
 
@@ -126,15 +133,15 @@ def set_state(
         raise ValueError("Received tasks with no DAG")
 
     if execution_date:
-        dag_run_id = dag.get_dagrun(execution_date=execution_date).run_id
+        dag_run_id = dag.get_dagrun(execution_date=execution_date, session=session).run_id
     if not dag_run_id:
         raise ValueError("Received tasks with no dag_run_id")
 
-    dag_run_ids = get_run_ids(dag, dag_run_id, future, past)
+    dag_run_ids = get_run_ids(dag, dag_run_id, future, past, session=session)
 
     task_ids = list(find_task_relatives(tasks, downstream, upstream))
 
-    confirmed_dates = verify_dag_run_integrity(dag, dag_run_ids)
+    confirmed_dates = verify_dag_run_integrity(dag, dag_run_ids, session=session)
 
     sub_dag_run_ids = get_subdag_runs(dag, session, DagRunState(state), task_ids, commit, confirmed_dates)
 
@@ -148,7 +155,7 @@ def set_state(
             qry_sub_dag = all_subdag_tasks_query(sub_dag_run_ids, session, state, confirmed_dates)
             tis_altered += qry_sub_dag.with_for_update().all()
         for task_instance in tis_altered:
-            task_instance.set_state(state)
+            task_instance.set_state(state, session=session)
     else:
         tis_altered = qry_dag.all()
         if sub_dag_run_ids:
@@ -208,10 +215,10 @@ def get_subdag_runs(
     while dags:
         current_dag = dags.pop()
         for task_id in task_ids:
-            if not current_dag.has_task(task_id):
+            current_task = current_dag.task_dict.get(task_id)
+            if current_task is None:
                 continue
 
-            current_task = current_dag.get_task(task_id)
             if isinstance(current_task, SubDagOperator) or current_task.task_type == "SubDagOperator":
                 # this works as a kind of integrity check
                 # it creates missing dag runs for subdag operators,
@@ -223,6 +230,7 @@ def get_subdag_runs(
                     execution_dates=confirmed_dates,
                     state=DagRunState.RUNNING,
                     run_type=DagRunType.BACKFILL_JOB,
+                    session=session,
                 )
 
                 verify_dagruns(dag_runs, commit, state, session, current_task)
@@ -250,23 +258,26 @@ def verify_dagruns(
     """
     for dag_run in dag_runs:
         dag_run.dag = current_task.subdag
-        dag_run.verify_integrity()
+        dag_run.verify_integrity(session=session)
         if commit:
             dag_run.state = state
             session.merge(dag_run)
 
 
-def verify_dag_run_integrity(dag: DAG, run_ids: List[str]) -> List[datetime]:
+@provide_session
+def verify_dag_run_integrity(
+    dag: DAG, run_ids: List[str], session: SASession = NEW_SESSION
+) -> List[datetime]:
     """
     Verify the integrity of the dag runs in case a task was added or removed
     set the confirmed execution dates as they might be different
     from what was provided
     """
     confirmed_dates = []
-    dag_runs = DagRun.find(dag_id=dag.dag_id, run_id=run_ids)
+    dag_runs = DagRun.find(dag_id=dag.dag_id, run_id=run_ids, session=session)
     for dag_run in dag_runs:
         dag_run.dag = dag
-        dag_run.verify_integrity()
+        dag_run.verify_integrity(session=session)
         confirmed_dates.append(dag_run.execution_date)
     return confirmed_dates
 
@@ -276,11 +287,9 @@ def find_task_relatives(tasks, downstream, upstream):
     for task in tasks:
         yield task.task_id
         if downstream:
-            for relative in task.get_flat_relatives(upstream=False):
-                yield relative.task_id
+            yield from task.get_flat_relative_ids(upstream=False)
         if upstream:
-            for relative in task.get_flat_relatives(upstream=True):
-                yield relative.task_id
+            yield from task.get_flat_relative_ids(upstream=True)
 
 
 @provide_session
@@ -316,25 +325,28 @@ def get_execution_dates(
 @provide_session
 def get_run_ids(dag: DAG, run_id: str, future: bool, past: bool, session: SASession = NEW_SESSION):
     """Returns run_ids of DAG execution"""
-    last_dagrun = dag.get_last_dagrun(include_externally_triggered=True)
-    current_dagrun = dag.get_dagrun(run_id=run_id)
-    first_dagrun = (
-        session.query(DagRun)
-        .filter(DagRun.dag_id == dag.dag_id)
-        .order_by(DagRun.execution_date.asc())
-        .first()
-    )
+    last_dagrun = dag.get_last_dagrun(include_externally_triggered=True, session=session)
+    current_dagrun = dag.get_dagrun(run_id=run_id, session=session)
 
     if last_dagrun is None:
         raise ValueError(f'DagRun for {dag.dag_id} not found')
 
     # determine run_id range of dag runs and tasks to consider
     end_date = last_dagrun.logical_date if future else current_dagrun.logical_date
-    start_date = current_dagrun.logical_date if not past else first_dagrun.logical_date
+    if past:
+        first_dagrun = (
+            session.query(DagRun)
+            .filter(DagRun.dag_id == dag.dag_id)
+            .order_by(DagRun.execution_date.asc())
+            .first()
+        )
+        start_date = first_dagrun.logical_date
+    else:
+        start_date = current_dagrun.logical_date
     if not dag.timetable.can_run:
         # If the DAG never schedules, need to look at existing DagRun if the user wants future or
         # past runs.
-        dag_runs = dag.get_dagruns_between(start_date=start_date, end_date=end_date)
+        dag_runs = dag.get_dagruns_between(start_date=start_date, end_date=end_date, session=session)
         run_ids = sorted({d.run_id for d in dag_runs})
     elif not dag.timetable.periodic:
         run_ids = [run_id]
@@ -342,7 +354,7 @@ def get_run_ids(dag: DAG, run_id: str, future: bool, past: bool, session: SASess
         dates = [
             info.logical_date for info in dag.iter_dagrun_infos_between(start_date, end_date, align=False)
         ]
-        run_ids = [dr.run_id for dr in DagRun.find(dag_id=dag.dag_id, execution_date=dates)]
+        run_ids = [dr.run_id for dr in DagRun.find(dag_id=dag.dag_id, execution_date=dates, session=session)]
     return run_ids
 
 
@@ -456,13 +468,13 @@ def set_dag_run_state_to_failed(
 
     # Mark only RUNNING task instances.
     task_ids = [task.task_id for task in dag.tasks]
-    tis = session.query(TaskInstance).filter(
+    tis = session.query(TaskInstance.task_id).filter(
         TaskInstance.dag_id == dag.dag_id,
         TaskInstance.run_id == run_id,
         TaskInstance.task_id.in_(task_ids),
         TaskInstance.state.in_(State.running),
     )
-    task_ids_of_running_tis = [task_instance.task_id for task_instance in tis]
+    task_ids_of_running_tis = {task_id for (task_id,) in tis}
 
     tasks = []
     for task in dag.tasks: